@@ -0,0 +1,51 @@
+"""
+JIT-ядро проверки валидности позиции стикера (Numba, опционально)
+
+Если numba установлена, весь горячий путь is_position_valid — границы,
+внутренняя зона и перебор размещённых прямоугольников — выполняется
+одним скомпилированным ядром без участия интерпретатора. Без numba
+алгоритмы используют векторный NumPy-путь.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+
+def _position_valid_impl(x, y, w, h, placed_rects, n_placed,
+                         ix1, iy1, ix2, iy2,
+                         template_w, template_h, overlap, check_overlap):
+    """Проверка позиции на чистых целых: границы, зона, перекрытия."""
+    # Разрешаем выход за границы с учетом overlap
+    if x + w < -overlap or x > template_w + overlap:
+        return False
+    if y + h < -overlap or y > template_h + overlap:
+        return False
+
+    # Стикер целиком внутри внутренней зоны — недопустимо
+    if x >= ix1 and x + w <= ix2 and y >= iy1 and y + h <= iy2:
+        return False
+
+    # Перекрытие с уже размещёнными
+    if check_overlap:
+        x2 = x + w
+        y2 = y + h
+        for i in range(n_placed):
+            if (placed_rects[i, 2] > x and placed_rects[i, 0] < x2 and
+                    placed_rects[i, 3] > y and placed_rects[i, 1] < y2):
+                return False
+
+    return True
+
+
+if HAVE_NUMBA:
+    position_valid = njit(cache=True)(_position_valid_impl)
+    # Прогрев: компиляция при импорте, а не на первом кадре
+    position_valid(0, 0, 1, 1, np.empty((0, 4), dtype=np.int32), 0,
+                   0, 0, 10, 10, 100, 100, 0, False)
+else:
+    position_valid = None
@@ -4,28 +4,127 @@
 
 import random
 import math
+from dataclasses import dataclass
 from typing import List, Tuple, Optional, Set
+
+import numpy as np
 from PIL import Image
 
 from frame_config import StickerConfig, FrameConfig, BorderSide
+from .spatial_hash import SpatialHashGrid
+from ._collide import position_valid as _jit_position_valid
+
+# До этого количества размещённых стикеров прямой векторный перебор
+# быстрее, чем обращение к хеш-сетке
+_GRID_THRESHOLD = 32
+
+# Таблицы знаков для четырёх углов шаблона:
+# индекс 0..3 = левый верхний, правый верхний, левый нижний, правый нижний
+CORNER_SX = np.array([-1, 1, -1, 1], dtype=np.int32)
+CORNER_SY = np.array([-1, -1, 1, 1], dtype=np.int32)
+
+# Шаг сетки для таблиц плотности: точность в 8 пикселей достаточна
+# для вероятностного отбора позиций
+DENSITY_LUT_STRIDE = 8
+
+# Кэш позиций периметра между генерациями: каждый запуск создаёт новый
+# экземпляр алгоритма, но сами позиции зависят только от геометрии
+# рамки. Пока шаблон, граница и стороны не менялись, повторные
+# генерации переиспользуют готовый массив; случайность кадра при этом
+# сохраняется за счёт перестановки пула, выбора стикеров и поворотов
+_position_cache = {}
+_POSITION_CACHE_LIMIT = 16
+
+# Битовые константы сторон: проверка "активна ли сторона" в горячих
+# циклах — одно целочисленное И вместо хеширования строки
+SIDE_TOP, SIDE_BOTTOM, SIDE_LEFT, SIDE_RIGHT, SIDE_CORNERS = 1, 2, 4, 8, 16
+
+_SIDE_BITS = {
+    'top': SIDE_TOP,
+    'bottom': SIDE_BOTTOM,
+    'left': SIDE_LEFT,
+    'right': SIDE_RIGHT,
+    'corners': SIDE_CORNERS,
+}
+
+# Соответствие режима рамки активным сторонам: один поиск по хешу
+# вместо цепочки сравнений Enum
+_SIDES_MAP = {
+    BorderSide.ALL: frozenset({'top', 'bottom', 'left', 'right'}),
+    BorderSide.TOP: frozenset({'top'}),
+    BorderSide.BOTTOM: frozenset({'bottom'}),
+    BorderSide.LEFT: frozenset({'left'}),
+    BorderSide.RIGHT: frozenset({'right'}),
+    BorderSide.TOP_BOTTOM: frozenset({'top', 'bottom'}),
+    BorderSide.LEFT_RIGHT: frozenset({'left', 'right'}),
+    BorderSide.CORNERS: frozenset({'corners'}),
+}
+
+
+@dataclass(frozen=True)
+class AlgorithmProfile:
+    """Параметры распределения позиций для одного алгоритма размещения.
+
+    Все четыре алгоритма отличаются только этими числами; сама генерация
+    позиций реализована один раз в BaseAlgorithm.
+    """
+    sweep: bool = False            # детерминированный обход периметра с шагом
+    positions_per_side: int = 50   # позиций на сторону в равномерном режиме
+    total_positions: int = 0       # при >0 общий бюджет раздаётся по сторонам
+    corner_weight: float = 0.0     # доля бюджета, уходящая в углы шаблона
+    corner_falloff: int = 1        # степень прижатия угловых позиций к углу
+    center_bias: float = 0.0       # сужение глубины зоны к краям стороны
+    edge_divisor: int = 2          # глубина зоны стороны = border // edge_divisor
+    side_keep_prob: float = 1.0    # вероятность оставить позицию на стороне
+    corner_box: bool = False       # углы: квадратная зона вместо диагонали
 
 
 class BaseAlgorithm:
     """Базовый алгоритм случайного размещения стикеров"""
-    
+
+    _profile = AlgorithmProfile(sweep=True)
+
     def __init__(self, config: FrameConfig):
+        # Проверяем один раз здесь, а не в каждом методе горячего пути
+        if not config.template_size:
+            raise ValueError("FrameConfig.template_size must be set")
         self.config = config
         self.inner_rect: Optional[Tuple[int, int, int, int]] = None
-        self.perimeter_positions: List[Tuple[int, int]] = []
+        # Локальный генератор: randrange без лишнего кадра randint
+        # и без обращения к модульному синглтону random
+        self._rand = random.Random()
+        # Позиции храним как массив (N, 2) int32 вместо списка кортежей:
+        # одна непрерывная аллокация и готовность к векторным проверкам
+        self.perimeter_positions: np.ndarray = np.empty((0, 2), dtype=np.int32)
+        # Прямоугольники уже размещённых стикеров (x1, y1, x2, y2):
+        # буфер с запасом, растёт удвоением вместо переаллокации на каждый стикер
+        self._placed_rects: np.ndarray = np.empty((64, 4), dtype=np.int32)
+        self._placed_count = 0
+        # Хеш-сетка для отсечения кандидатов: ячейка ~2 средних размера стикера
+        self._grid = SpatialHashGrid(max(32, config.max_sticker_size * 2))
+        # Активные стороны вычисляются один раз: алгоритм живёт не дольше
+        # одной генерации, конфигурация за это время не меняется
+        self._active_sides = self._get_active_sides()
+        self._active_sides_tuple = tuple(self._active_sides)
+        self._sides_mask = sum(_SIDE_BITS[s] for s in self._active_sides)
+        self._bind_config()
+
+    def _bind_config(self):
+        """Копирует горячие поля конфигурации в атрибуты экземпляра.
+
+        В циклах генерации позиций это заменяет двухуровневый поиск
+        self.config.X одним обращением к атрибуту.
+        """
+        config = self.config
+        self._tw, self._th = config.template_size
+        self._border = config.border_width
+        self._overlap = config.border_overlap
         
     def calculate_sticker_zone(self):
         """Рассчитывает зону для размещения стикеров по периметру."""
-        if not self.config.template_size:
-            return
-            
-        template_w, template_h = self.config.template_size
-        border = self.config.border_width
-        overlap = self.config.border_overlap
+        template_w, template_h = self._tw, self._th
+        border = self._border
+        overlap = self._overlap
         
         # Внутренняя зона
         inner_w = template_w - 2 * border
@@ -37,110 +136,289 @@ class BaseAlgorithm:
             border = min(template_w - inner_w, template_h - inner_h) // 2
         
         self.inner_rect = (border, border, border + inner_w, border + inner_h)
+        self._build_density_lut()
         self.generate_positions()
     
     def generate_positions(self):
-        """Генерирует возможные позиции для стикеров по периметру."""
-        if not self.config.template_size:
-            return
-            
-        template_w, template_h = self.config.template_size
-        border = self.config.border_width
-        overlap = self.config.border_overlap
-        
-        positions = []
+        """Генерирует возможные позиции для стикеров по периметру.
+
+        Единая реализация для всех алгоритмов: профиль задаёт
+        распределение, подклассы лишь объявляют свои параметры.
+        """
+        key = (type(self).__name__, self._tw, self._th, self._border,
+               self._overlap, self.config.border_sides)
+        positions = _position_cache.get(key)
+        if positions is None:
+            if len(_position_cache) >= _POSITION_CACHE_LIMIT:
+                _position_cache.clear()
+            if self._profile.sweep:
+                positions = self._sweep_positions()
+            else:
+                positions = self._batch_positions()
+            _position_cache[key] = positions
+        self.perimeter_positions = positions
+
+    def _sweep_positions(self) -> np.ndarray:
+        """Детерминированный обход периметра с шагом (базовый алгоритм)."""
+        template_w, template_h = self._tw, self._th
+        border = self._border
+        overlap = self._overlap
+
         step = max(5, border // 10)
-        
-        # Определяем, какие стороны активны
-        sides = self._get_active_sides()
-        
+
+        # Определяем, какие стороны активны (битовая маска)
+        sides = self._sides_mask
+
+        # Координаты обхода и случайная глубина — пакетными массивами:
+        # один вызов np.random.randint на сторону вместо randrange
+        # на каждую позицию
+        x_sweep = np.arange(-overlap, template_w + overlap, step, dtype=np.int32)
+        y_sweep = np.arange(border, template_h - border, step, dtype=np.int32)
+        corner_size = border + overlap
+        corner_sweep = np.arange(-overlap, corner_size, step, dtype=np.int32)
+
+        depth_outer = border // 2 + 1
+        depth_inner = border // 2 + overlap + 1
+        blocks = []
+
         # Базовый алгоритм - простой перебор с шагом
-        if 'top' in sides:
-            for x in range(-overlap, template_w + overlap, step):
-                positions.append((x, random.randint(-overlap, border // 2)))
-        
-        if 'bottom' in sides:
-            for x in range(-overlap, template_w + overlap, step):
-                positions.append((x, template_h - random.randint(1, border // 2 + overlap)))
-        
-        if 'left' in sides:
-            for y in range(border, template_h - border, step):
-                positions.append((random.randint(-overlap, border // 2), y))
-        
-        if 'right' in sides:
-            for y in range(border, template_h - border, step):
-                positions.append((template_w - random.randint(1, border // 2 + overlap), y))
-        
-        if 'corners' in sides:
-            # Угловые позиции
-            corner_size = border + overlap
-            for x in range(-overlap, corner_size, step):
-                for y in range(-overlap, corner_size, step):
-                    positions.append((x, y))  # Левый верхний угол
-                    positions.append((template_w - x - 1, y))  # Правый верхний
-                    positions.append((x, template_h - y - 1))  # Левый нижний
-                    positions.append((template_w - x - 1, template_h - y - 1))  # Правый нижний
-        
-        self.perimeter_positions = positions
-    
-    def _get_active_sides(self) -> Set[str]:
+        if sides & SIDE_TOP:
+            jitter = np.random.randint(-overlap, depth_outer, x_sweep.size)
+            blocks.append(np.column_stack((x_sweep, jitter)))
+
+        if sides & SIDE_BOTTOM:
+            jitter = template_h - np.random.randint(1, depth_inner, x_sweep.size)
+            blocks.append(np.column_stack((x_sweep, jitter)))
+
+        if sides & SIDE_LEFT:
+            jitter = np.random.randint(-overlap, depth_outer, y_sweep.size)
+            blocks.append(np.column_stack((jitter, y_sweep)))
+
+        if sides & SIDE_RIGHT:
+            jitter = template_w - np.random.randint(1, depth_inner, y_sweep.size)
+            blocks.append(np.column_stack((jitter, y_sweep)))
+
+        if sides & SIDE_CORNERS:
+            # Сетка одного угла, отражённая на остальные три
+            cx, cy = (a.ravel() for a in np.meshgrid(corner_sweep, corner_sweep,
+                                                     indexing='ij'))
+            blocks.append(np.column_stack((cx, cy)))                                  # левый верхний
+            blocks.append(np.column_stack((template_w - cx - 1, cy)))                 # правый верхний
+            blocks.append(np.column_stack((cx, template_h - cy - 1)))                 # левый нижний
+            blocks.append(np.column_stack((template_w - cx - 1, template_h - cy - 1)))  # правый нижний
+
+        if not blocks:
+            return np.empty((0, 2), dtype=np.int32)
+        return np.concatenate(blocks).astype(np.int32, copy=False)
+
+    def _batch_positions(self) -> np.ndarray:
+        """Случайные позиции по бюджету профиля, векторно по сторонам."""
+        p = self._profile
+        sides_tuple = self._active_sides_tuple
+        blocks = []
+
+        # Бюджет углов (угловой алгоритм) отделяется до раздачи по сторонам
+        corner_budget = int(p.total_positions * p.corner_weight)
+        side_budget = p.total_positions - corner_budget
+
+        if corner_budget:
+            blocks.append(self._sample_corner_cluster(corner_budget, p.corner_falloff))
+
+        if sides_tuple:
+            if not p.total_positions:
+                # Фиксированное количество на каждую сторону
+                counts = [p.positions_per_side] * len(sides_tuple)
+            elif p.side_keep_prob < 1.0:
+                # Прореживание: каждая сторона претендует на весь бюджет,
+                # но удерживает позицию с вероятностью side_keep_prob
+                counts = np.random.binomial(side_budget, p.side_keep_prob,
+                                            len(sides_tuple))
+            else:
+                # Случайная раздача общего бюджета по сторонам
+                side_idx = np.random.randint(0, len(sides_tuple), side_budget)
+                counts = [(side_idx == k).sum() for k in range(len(sides_tuple))]
+
+            for side, n in zip(sides_tuple, counts):
+                n = int(n)
+                if n:
+                    blocks.append(self._sample_side(side, n))
+
+        if blocks:
+            return np.concatenate(blocks).astype(np.int32)
+        return np.empty((0, 2), dtype=np.int32)
+
+    def _sample_side(self, side: str, n: int) -> np.ndarray:
+        """Генерирует n позиций вдоль одной стороны одним векторным проходом."""
+        p = self._profile
+        template_w, template_h = self._tw, self._th
+        border = self._border
+        overlap = self._overlap
+        depth = border // p.edge_divisor
+
+        if side == 'top':
+            xs = np.random.randint(-overlap, template_w + overlap + 1, n)
+            d = self._side_depth(xs, template_w, depth)
+            ys = (np.random.random(n) * (d + overlap + 1)).astype(np.int32) - overlap
+        elif side == 'bottom':
+            xs = np.random.randint(-overlap, template_w + overlap + 1, n)
+            d = self._side_depth(xs, template_w, depth)
+            ys = template_h - ((np.random.random(n) * (d + overlap)).astype(np.int32) + 1)
+        elif side == 'left':
+            ys = np.random.randint(border, template_h - border + 1, n)
+            d = self._side_depth(ys, template_h, depth)
+            xs = (np.random.random(n) * (d + overlap + 1)).astype(np.int32) - overlap
+        elif side == 'right':
+            ys = np.random.randint(border, template_h - border + 1, n)
+            d = self._side_depth(ys, template_h, depth)
+            xs = template_w - ((np.random.random(n) * (d + overlap)).astype(np.int32) + 1)
+        else:  # 'corners'
+            if p.corner_box:
+                return self._sample_corner_box(n)
+            return self._sample_corner_cluster(n, 1)
+
+        return np.stack([xs, ys], axis=1)
+
+    def _side_depth(self, coords: np.ndarray, axis_size: int, depth: int) -> np.ndarray:
+        """Глубина зоны от края; при center_bias сужается к краям стороны."""
+        p = self._profile
+        if p.center_bias:
+            center_factor = np.abs(coords - axis_size / 2) / (axis_size / 2)
+            return np.maximum(1, (depth * (1 - center_factor * p.center_bias)).astype(np.int32))
+        return np.full(len(coords), max(1, depth), dtype=np.int32)
+
+    def _sample_corner_box(self, n: int) -> np.ndarray:
+        """Генерирует n позиций равномерно в квадратной зоне углов.
+
+        В отличие от _sample_corner_cluster смещения по осям
+        разыгрываются независимо: зона каждого угла заполняется целиком
+        (от -overlap снаружи до border+overlap внутрь), а не
+        вырождается в диагональ.
+        """
+        corner_size = self._border + self._overlap
+        ox = np.random.randint(-self._overlap, corner_size + 1, n)
+        oy = np.random.randint(-self._overlap, corner_size + 1, n)
+        corner = np.random.randint(0, 4, n)
+        base_x = np.array([0, self._tw, 0, self._tw], dtype=np.int32)
+        base_y = np.array([0, 0, self._th, self._th], dtype=np.int32)
+        # Знаки обратные кластерным: смещение откладывается от угла
+        # внутрь шаблона (отрицательная часть диапазона — заход наружу)
+        xs = base_x[corner] - CORNER_SX[corner] * ox
+        ys = base_y[corner] - CORNER_SY[corner] * oy
+        return np.stack([xs, ys], axis=1)
+
+    def _sample_corner_cluster(self, n: int, falloff: int) -> np.ndarray:
+        """Генерирует n позиций, прижатых к углам шаблона."""
+        corner_size = self._border + self._overlap
+        # Степень >1 сгущает позиции у самого угла
+        distance = np.random.random(n) ** falloff
+        offset = (corner_size * distance).astype(np.int32)
+        corner = np.random.randint(0, 4, n)
+        base_x = np.array([0, self._tw, 0, self._tw], dtype=np.int32)
+        base_y = np.array([0, 0, self._th, self._th], dtype=np.int32)
+        xs = base_x[corner] + CORNER_SX[corner] * offset
+        ys = base_y[corner] + CORNER_SY[corner] * offset
+        return np.stack([xs, ys], axis=1)
+
+    def _get_active_sides(self) -> frozenset:
         """Возвращает набор активных сторон для размещения стикеров."""
-        sides = set()
-        
-        if self.config.border_sides == BorderSide.ALL:
-            sides.update(['top', 'bottom', 'left', 'right'])
-        elif self.config.border_sides == BorderSide.TOP:
-            sides.add('top')
-        elif self.config.border_sides == BorderSide.BOTTOM:
-            sides.add('bottom')
-        elif self.config.border_sides == BorderSide.LEFT:
-            sides.add('left')
-        elif self.config.border_sides == BorderSide.RIGHT:
-            sides.add('right')
-        elif self.config.border_sides == BorderSide.TOP_BOTTOM:
-            sides.update(['top', 'bottom'])
-        elif self.config.border_sides == BorderSide.LEFT_RIGHT:
-            sides.update(['left', 'right'])
-        elif self.config.border_sides == BorderSide.CORNERS:
-            sides.add('corners')
-        
-        return sides
+        return _SIDES_MAP.get(self.config.border_sides, frozenset())
     
-    def is_position_valid(self, sticker: StickerConfig, placed_stickers: List[StickerConfig]) -> bool:
+    def _build_density_lut(self):
+        """Строит таблицы плотности; базовому алгоритму они не нужны."""
+
+    def _lut_grid(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Сетки координат (xs, ys) для построения таблиц плотности."""
+        template_w, template_h = self._tw, self._th
+        stride = DENSITY_LUT_STRIDE
+        ys, xs = np.mgrid[0:template_h // stride + 1, 0:template_w // stride + 1]
+        return xs * stride, ys * stride
+
+    @staticmethod
+    def _lut_value(lut: np.ndarray, x: int, y: int) -> float:
+        """Читает значение таблицы с защитой от выхода за границы шаблона."""
+        h, w = lut.shape
+        stride = DENSITY_LUT_STRIDE
+        row = min(max(y // stride, 0), h - 1)
+        col = min(max(x // stride, 0), w - 1)
+        return float(lut[row, col])
+
+    @staticmethod
+    def _lut_values(lut: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Пакетное чтение таблицы для массива позиций (N, 2)."""
+        h, w = lut.shape
+        stride = DENSITY_LUT_STRIDE
+        rows = np.clip(positions[:, 1] // stride, 0, h - 1)
+        cols = np.clip(positions[:, 0] // stride, 0, w - 1)
+        return lut[rows, cols]
+
+    def register_placement(self, sticker: StickerConfig):
+        """Запоминает прямоугольник размещённого стикера для проверок перекрытия."""
+        x, y = sticker.position
+        w, h = sticker.size
+        if self._placed_count == len(self._placed_rects):
+            self._placed_rects = np.concatenate(
+                [self._placed_rects, np.empty_like(self._placed_rects)])
+        self._placed_rects[self._placed_count] = (x, y, x + w, y + h)
+        self._grid.insert((x, y, x + w, y + h), self._placed_count)
+        self._placed_count += 1
+
+    def is_position_valid(self, sticker: StickerConfig) -> bool:
         """Проверяет валидность позиции стикера."""
         if not self.inner_rect:
             return True
-            
+
         x, y = sticker.position
         w, h = sticker.size
-        
+
+        # При наличии numba вся проверка выполняется одним JIT-ядром
+        if _jit_position_valid is not None:
+            ix1, iy1, ix2, iy2 = self.inner_rect
+            return bool(_jit_position_valid(
+                x, y, w, h, self._placed_rects, self._placed_count,
+                ix1, iy1, ix2, iy2,
+                self._tw, self._th,
+                self._overlap,
+                not self.config.overlap_allowed
+            ))
+
         # Разрешаем выход за границы с учетом overlap
-        overlap = self.config.border_overlap
-        if x + w < -overlap or x > self.config.template_size[0] + overlap:
+        overlap = self._overlap
+        if x + w < -overlap or x > self._tw + overlap:
             return False
-        if y + h < -overlap or y > self.config.template_size[1] + overlap:
+        if y + h < -overlap or y > self._th + overlap:
             return False
-        
-        # Проверка внутренней зоны (только если стикер полностью внутри)
-        sticker_rect = (x, y, x + w, y + h)
-        if self._rectangles_overlap(sticker_rect, self.inner_rect):
-            if (x >= self.inner_rect[0] and x + w <= self.inner_rect[2] and
-                y >= self.inner_rect[1] and y + h <= self.inner_rect[3]):
+
+        # Недопустим только стикер, целиком лежащий во внутренней зоне;
+        # полная вложенность сама подразумевает пересечение, так что
+        # отдельный precheck через _rectangles_overlap не нужен
+        ir = self.inner_rect
+        if x >= ir[0] and x + w <= ir[2] and y >= ir[1] and y + h <= ir[3]:
+            return False
+
+        # Проверка перекрытия: один векторный проход по всем размещённым
+        # прямоугольникам вместо цикла по объектам; при большом их числе
+        # сначала отсекаем кандидатов через хеш-сетку
+        if not self.config.overlap_allowed and self._placed_count:
+            pr = self._placed_rects[:self._placed_count]
+            if len(pr) >= _GRID_THRESHOLD:
+                ids = list(self._grid.query((x, y, x + w, y + h)))
+                if not ids:
+                    return True
+                pr = pr[ids]
+            overlapping = ~((pr[:, 2] <= x) | (pr[:, 0] >= x + w) |
+                            (pr[:, 3] <= y) | (pr[:, 1] >= y + h))
+            if overlapping.any():
                 return False
-        
-        # Проверка перекрытия
-        if not self.config.overlap_allowed:
-            for placed in placed_stickers:
-                placed_rect = (placed.position[0], placed.position[1],
-                              placed.position[0] + placed.size[0],
-                              placed.position[1] + placed.size[1])
-                if self._rectangles_overlap(sticker_rect, placed_rect):
-                    return False
-        
+
         return True
     
     @staticmethod
     def _rectangles_overlap(rect1: Tuple[int, int, int, int], rect2: Tuple[int, int, int, int]) -> bool:
-        """Проверяет пересечение двух прямоугольников."""
-        return not (rect1[2] <= rect2[0] or rect1[0] >= rect2[2] or
-                   rect1[3] <= rect2[1] or rect1[1] >= rect2[3])
\ No newline at end of file
+        """Проверяет пересечение двух прямоугольников.
+
+        Безветвенная форма: все четыре сравнения объединяются побитовым
+        И вместо цепочки or с короткими замыканиями — позиции стикеров
+        случайны, и предсказать такие ветвления процессору нечем.
+        """
+        return ((rect1[2] > rect2[0]) & (rect1[0] < rect2[2]) &
+                (rect1[3] > rect2[1]) & (rect1[1] < rect2[3]))
\ No newline at end of file
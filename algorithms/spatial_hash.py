@@ -0,0 +1,46 @@
+"""
+Пространственная хеш-сетка для быстрого поиска пересечений прямоугольников
+"""
+
+from collections import defaultdict
+from typing import Iterator, Set, Tuple
+
+
+class SpatialHashGrid:
+    """Хеш-сетка: прямоугольники раскладываются по ячейкам фиксированного размера.
+
+    При проверке кандидата достаточно просмотреть только прямоугольники
+    из ячеек, которые он задевает, вместо полного перебора.
+    """
+
+    def __init__(self, cell_size: int):
+        self.cell_size = max(1, cell_size)
+        self.cells = defaultdict(list)
+
+    def _cell_range(self, rect: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        """Диапазон индексов ячеек, которые покрывает прямоугольник."""
+        cell = self.cell_size
+        x1, y1, x2, y2 = rect
+        return x1 // cell, y1 // cell, (x2 - 1) // cell, (y2 - 1) // cell
+
+    def insert(self, rect: Tuple[int, int, int, int], rect_id: int):
+        """Добавляет прямоугольник во все ячейки, которые он покрывает."""
+        cx1, cy1, cx2, cy2 = self._cell_range(rect)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self.cells[(cx, cy)].append(rect_id)
+
+    def query(self, rect: Tuple[int, int, int, int]) -> Iterator[int]:
+        """Возвращает идентификаторы прямоугольников из ячеек кандидата."""
+        cx1, cy1, cx2, cy2 = self._cell_range(rect)
+        seen: Set[int] = set()
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                for rect_id in self.cells.get((cx, cy), ()):
+                    if rect_id not in seen:
+                        seen.add(rect_id)
+                        yield rect_id
+
+    def clear(self):
+        """Очищает сетку."""
+        self.cells.clear()
@@ -2,100 +2,48 @@
 Алгоритм равномерного размещения стикеров
 """
 
-import random
 import math
-from typing import List, Tuple, Optional, Set
-from PIL import Image
+from typing import Tuple
 
-from frame_config import StickerConfig, FrameConfig, BorderSide
-from .base_algorithm import BaseAlgorithm
+import numpy as np
+
+from .base_algorithm import BaseAlgorithm, AlgorithmProfile
 
 
 class UniformAlgorithm(BaseAlgorithm):
     """Алгоритм равномерного размещения стикеров"""
-    
-    def generate_positions(self):
-        """Генерирует равномерные позиции для стикеров по периметру."""
-        if not self.config.template_size:
-            return
-            
-        template_w, template_h = self.config.template_size
-        border = self.config.border_width
-        overlap = self.config.border_overlap
-        
-        positions = []
-        sides = self._get_active_sides()
-        
-        # Равномерное количество позиций для каждой стороны
-        positions_per_side = 50  # Фиксированное количество позиций на сторону
-        
-        if 'top' in sides:
-            for i in range(positions_per_side):
-                x = random.randint(-overlap, template_w + overlap)
-                y = random.randint(-overlap, border // 2)
-                positions.append((x, y))
-        
-        if 'bottom' in sides:
-            for i in range(positions_per_side):
-                x = random.randint(-overlap, template_w + overlap)
-                y = random.randint(template_h - border // 2 - overlap, template_h + overlap)
-                positions.append((x, y))
-        
-        if 'left' in sides:
-            for i in range(positions_per_side):
-                x = random.randint(-overlap, border // 2)
-                y = random.randint(border, template_h - border)
-                positions.append((x, y))
-        
-        if 'right' in sides:
-            for i in range(positions_per_side):
-                x = random.randint(template_w - border // 2 - overlap, template_w + overlap)
-                y = random.randint(border, template_h - border)
-                positions.append((x, y))
-        
-        if 'corners' in sides:
-            # Угловые позиции
-            corner_size = border + overlap
-            corner_positions = positions_per_side // 4
-            
-            for i in range(corner_positions):
-                # Левый верхний угол
-                positions.append((
-                    random.randint(-overlap, corner_size),
-                    random.randint(-overlap, corner_size)
-                ))
-                # Правый верхний угол
-                positions.append((
-                    random.randint(template_w - corner_size - overlap, template_w + overlap),
-                    random.randint(-overlap, corner_size)
-                ))
-                # Левый нижний угол
-                positions.append((
-                    random.randint(-overlap, corner_size),
-                    random.randint(template_h - corner_size - overlap, template_h + overlap)
-                ))
-                # Правый нижний угол
-                positions.append((
-                    random.randint(template_w - corner_size - overlap, template_w + overlap),
-                    random.randint(template_h - corner_size - overlap, template_h + overlap)
-                ))
-        
-        self.perimeter_positions = positions
-    
+
+    # Равномерное количество позиций для каждой стороны; угловые зоны
+    # заполняются квадратом, как в исходной реализации
+    _profile = AlgorithmProfile(positions_per_side=50, corner_box=True)
+
     def get_gradient_density(self, position: Tuple[int, int]) -> float:
         """Рассчитывает коэффициент плотности для градиентного заполнения."""
         if not self.config.gradient_density:
             return 1.0
-        
+
         x, y = position
-        template_w, template_h = self.config.template_size
-        
+        template_w, template_h = self._tw, self._th
+
         if self.config.gradient_type == "linear":
-            # Линейный градиент от центра к краям
+            # Линейный градиент от центра к краям: один hypot вместо
+            # двух sqrt от сумм квадратов
             center_x, center_y = template_w // 2, template_h // 2
-            distance = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
-            max_distance = math.sqrt(center_x ** 2 + center_y ** 2)
-            return max(0.3, min(1.0, distance / max_distance))
+            ratio = math.hypot(x - center_x, y - center_y) / math.hypot(center_x, center_y)
+            return max(0.3, min(1.0, ratio))
         else:
             # Радиальный градиент
-            return random.uniform(0.3, 1.0)
\ No newline at end of file
+            return self._rand.uniform(0.3, 1.0)
+
+    def get_gradient_density_batch(self, positions: np.ndarray) -> np.ndarray:
+        """Пакетная версия: плотность сразу для массива позиций (N, 2)."""
+        if not self.config.gradient_density:
+            return np.ones(len(positions))
+
+        if self.config.gradient_type == "linear":
+            center_x, center_y = self._tw // 2, self._th // 2
+            ratio = np.hypot(positions[:, 0] - center_x,
+                             positions[:, 1] - center_y) / math.hypot(center_x, center_y)
+            return np.clip(ratio, 0.3, 1.0)
+        else:
+            return np.random.uniform(0.3, 1.0, len(positions))
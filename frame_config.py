@@ -27,9 +27,13 @@ class AlgorithmType(Enum):
     CORNER = "Угловой"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class StickerConfig:
-    """Конфигурация для стикера"""
+    """Конфигурация для стикера
+
+    Экземпляров создаются сотни на кадр, поэтому slots (нет __dict__,
+    вдвое меньше памяти) и frozen (после размещения стикер не меняется).
+    """
     path: str
     size: Tuple[int, int]
     position: Tuple[int, int]
@@ -37,9 +41,14 @@ class StickerConfig:
     opacity: float = 1.0
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FrameConfig:
-    """Конфигурация для фоторамки"""
+    """Конфигурация для фоторамки
+
+    Заморожена: алгоритмы читают поля миллионы раз за кадр и кэшируют
+    производные константы, поэтому конфигурация не должна меняться после
+    создания. Обновление — через dataclasses.replace.
+    """
     template_size: Tuple[int, int] = (1200, 800)
     output_size: Tuple[int, int] = (1920, 1080)
     sticker_dir: str = ""
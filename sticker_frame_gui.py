@@ -2,15 +2,21 @@
 Главный файл приложения - генератор фоторамок из стикеров
 """
 
+import functools
 import os
 import sys
 import random
 import math
 import json
 import io
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import replace
 from pathlib import Path
+from types import MappingProxyType
 from typing import List, Tuple, Optional
 
+import numpy as np
 from PIL import Image, ImageDraw
 
 # PyQt6 импорты
@@ -21,75 +27,328 @@ from PyQt6.QtWidgets import (
     QComboBox, QCheckBox, QScrollArea, QFrame,
     QSizePolicy, QButtonGroup, QRadioButton, QGridLayout
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize
-from PyQt6.QtGui import QPixmap, QFont, QPalette, QColor
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal, QSize
+from PyQt6.QtGui import QPixmap, QImage, QFont, QPalette, QColor
 
 # Импорты из наших модулей
-from frame_config import FrameConfig, BorderSide, AlgorithmType
+from frame_config import FrameConfig, StickerConfig, BorderSide, AlgorithmType
 import algorithms
+from algorithms._blend import blend_over as _jit_blend_over
+
+
+STICKER_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Типы градиента в порядке пунктов комбобокса: выбор по индексу,
+# без сравнения с локализованным текстом
+_GRAD_TYPES = ("linear", "radial")
+
+# Расширения файлов по формату сохранения
+_EXT_MAP = MappingProxyType({
+    "PNG": "png",
+    "JPEG": "jpg",
+    "WEBP": "webp",
+})
+
+
+@functools.lru_cache(maxsize=32)
+def _count_stickers(path: str, mtime: float) -> int:
+    """Считает файлы стикеров одним проходом scandir.
+
+    mtime входит в ключ кэша: пока директория не менялась, повторные
+    изменения настроек не перечитывают её вовсе.
+    """
+    count = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(STICKER_EXTENSIONS):
+                count += 1
+    return count
+
+
+# Кэш декодированных наборов стикеров: ключ — директория и её mtime,
+# чтобы кэш сбрасывался при изменении набора файлов. Не lru_cache,
+# потому что колбэк отмены не должен входить в ключ
+_sticker_sets = {}
+_STICKER_SETS_LIMIT = 8
+
+
+def _load_sticker_set(directory: str, mtime: float, stop_cb=None):
+    """Загружает и декодирует стикеры директории с их мип-пирамидами.
+
+    Кэш на уровне модуля: каждый GenerationThread создаёт новый
+    StickerFrameGenerator, и без кэша все PNG декодировались бы заново
+    на каждую генерацию. Изображения общие и только читаются.
+
+    stop_cb — колбэк отмены: декодирование большой директории занимает
+    заметное время, и отменённый запуск должен выйти из него, а не
+    только из цикла размещения. Прерванная загрузка возвращает None
+    и в кэш не попадает.
+    """
+    key = (directory, mtime)
+    cached = _sticker_sets.get(key)
+    if cached is not None:
+        return cached
+
+    def load_one(img_file):
+        try:
+            img = Image.open(img_file).convert("RGBA")
+            # Пирамида уменьшенных копий (box-среднее через reduce):
+            # финальный BILINEAR потом стартует с ближайшего уровня,
+            # а не с полного разрешения 512x512
+            return img, (img, img.reduce(2), img.reduce(4), img.reduce(8))
+        except Exception as e:
+            print(f"Ошибка загрузки {img_file}: {e}")
+            return None
+
+    # Один проход scandir вместо четырёх glob по директории
+    with os.scandir(directory) as entries:
+        paths = sorted(entry.path for entry in entries
+                       if entry.is_file()
+                       and entry.name.lower().endswith(STICKER_EXTENSIONS))
+
+    stickers = []
+    mipmaps = []
+    # Декодирование параллелится: PIL отпускает GIL внутри libpng
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        for loaded in pool.map(load_one, paths):
+            if stop_cb is not None and stop_cb():
+                return None
+            if loaded is not None:
+                stickers.append(loaded[0])
+                mipmaps.append(loaded[1])
+
+    if len(_sticker_sets) >= _STICKER_SETS_LIMIT:
+        _sticker_sets.clear()
+    _sticker_sets[key] = (tuple(stickers), tuple(mipmaps))
+    return _sticker_sets[key]
+
+
+# Кэши вариантов (масштаб/поворот/массив) живут вместе с набором
+# стикеров, а не с экземпляром генератора: каждый GenerationThread
+# создаёт новый StickerFrameGenerator, и без этого прогретые варианты
+# пропадали бы после каждой генерации. Держим один набор — актуальный
+_variant_caches = {}
+
+
+def _get_variant_caches(key):
+    """Возвращает тройку кэшей вариантов (scaled, rotated, array)."""
+    caches = _variant_caches.get(key)
+    if caches is None:
+        _variant_caches.clear()
+        caches = ({}, {}, {})
+        _variant_caches[key] = caches
+    return caches
+
+
+# Пул холстов: повторные генерации одного размера шаблона переиспользуют
+# буфер вместо выделения до ~8 МБ на каждый кадр. Хватает одного буфера
+# на актуальный размер, но только пока генерации не пересекаются:
+# когда отменённый поток ещё жив, новая генерация обязана взять свежий
+# буфер (reuse_canvas=False), иначе оба пишут в один массив
+_canvas_pool = {}
+
+
+def _acquire_canvas(height: int, width: int) -> np.ndarray:
+    """Возвращает холст (height, width, 4) из пула, не очищая его."""
+    canvas = _canvas_pool.get((height, width))
+    if canvas is None:
+        _canvas_pool.clear()
+        canvas = np.empty((height, width, 4), dtype=np.uint8)
+        _canvas_pool[(height, width)] = canvas
+    return canvas
 
 
 def pil_to_pixmap(pil_image: Image.Image) -> QPixmap:
-    """Конвертирует PIL.Image в QPixmap для PyQt6"""
-    buffer = io.BytesIO()
-    pil_image.save(buffer, format="PNG")
-    pixmap = QPixmap()
-    pixmap.loadFromData(buffer.getvalue())
-    return pixmap
+    """Конвертирует PIL.Image в QPixmap для PyQt6
+
+    QImage строится прямо на байтах RGBA без PNG-кодека: раньше каждое
+    обновление предпросмотра платило за deflate-сжатие и обратную
+    распаковку. QPixmap.fromImage копирует данные, поэтому время жизни
+    буфера ограничено этой функцией.
+    """
+    if pil_image.mode != "RGBA":
+        pil_image = pil_image.convert("RGBA")
+    data = pil_image.tobytes("raw", "RGBA")
+    qimg = QImage(data, pil_image.width, pil_image.height,
+                  pil_image.width * 4, QImage.Format.Format_RGBA8888)
+    return QPixmap.fromImage(qimg)
 
 
 class StickerFrameGenerator:
     """Генератор фоторамок из стикеров"""
     
-    def __init__(self, config: FrameConfig):
+    # Шаг квантования угла поворота для кэша (на глаз 5° не различимы)
+    ROTATION_STEP = 5
+    # Предел записей в кэшах вариантов, чтобы не раздувать память
+    CACHE_LIMIT = 512
+
+    def __init__(self, config: FrameConfig, stop_cb=None):
         self.config = config
+        # Колбэк отмены проверяется и при загрузке стикеров: это самая
+        # долгая фаза после смены директории
+        self._stop_cb = stop_cb
         self.stickers: List = []
         self.loaded_stickers: List[Image.Image] = []
-        
+        # Кэши готовых вариантов: размеры берутся из ограниченного
+        # диапазона, а стикеров немного, поэтому попадания очень часты
+        self._scaled_cache = {}
+        self._rotated_cache = {}
+        self._array_cache = {}
+        # Пирамиды мип-уровней исходников, параллельно loaded_stickers
+        self._mipmaps: List[Tuple[Image.Image, ...]] = []
+
         if config.sticker_dir:
             self._load_stickers()
+
+    def _get_scaled(self, sticker_idx: int, width: int, height: int) -> Image.Image:
+        """Возвращает масштабированный вариант стикера через кэш."""
+        key = (sticker_idx, width, height)
+        scaled = self._scaled_cache.get(key)
+        if scaled is None:
+            if len(self._scaled_cache) >= self.CACHE_LIMIT:
+                self._scaled_cache.clear()
+            # Берём наименьший мип-уровень, которого ещё хватает для
+            # качественного уменьшения: финальный проход работает по
+            # в разы меньшему исходнику. BILINEAR здесь в 4-9 раз
+            # дешевле LANCZOS и на стикерах 40-150 px неотличим;
+            # LANCZOS остаётся только на финальном выходном resize
+            source = self._mipmaps[sticker_idx][0]
+            target = max(width, height) * 1.5
+            for mip in self._mipmaps[sticker_idx]:
+                if max(mip.size) >= target:
+                    source = mip
+                else:
+                    break
+            scaled = source.resize((width, height), Image.Resampling.BILINEAR)
+            self._scaled_cache[key] = scaled
+        return scaled
+
+    def _get_rotated(self, sticker_idx: int, width: int, height: int,
+                     angle: float) -> Image.Image:
+        """Возвращает повёрнутый вариант стикера через кэш.
+
+        Угол уже квантован до ROTATION_STEP, поэтому ключей немного.
+        """
+        key = (sticker_idx, width, height, angle)
+        rotated = self._rotated_cache.get(key)
+        if rotated is None:
+            if len(self._rotated_cache) >= self.CACHE_LIMIT:
+                self._rotated_cache.clear()
+            rotated = self._rotate_sticker(
+                self._get_scaled(sticker_idx, width, height), angle)
+            self._rotated_cache[key] = rotated
+        return rotated
+
+    def _get_blend_array(self, sticker_idx: int, width: int, height: int,
+                         angle: float) -> np.ndarray:
+        """Возвращает готовый к наложению непрерывный uint8-массив.
+
+        Конвертация PIL→numpy копирует изображение, поэтому массив
+        кэшируется по тому же ключу, что и сами варианты. Прозрачность
+        в ключ не входит: её учитывает само смешивание.
+        """
+        key = (sticker_idx, width, height, angle)
+        arr = self._array_cache.get(key)
+        if arr is None:
+            if len(self._array_cache) >= self.CACHE_LIMIT:
+                self._array_cache.clear()
+            if angle != 0:
+                img = self._get_rotated(sticker_idx, width, height, angle)
+            else:
+                img = self._get_scaled(sticker_idx, width, height)
+            arr = np.ascontiguousarray(np.asarray(img))
+            self._array_cache[key] = arr
+        return arr
     
     def _load_stickers(self):
         """Загружает все PNG файлы из указанной директории."""
         sticker_dir = Path(self.config.sticker_dir)
         if not sticker_dir.exists():
             raise ValueError(f"Директория не найдена: {self.config.sticker_dir}")
-        
-        self.loaded_stickers.clear()
-        for ext in ['*.png', '*.jpg', '*.jpeg', '*.webp']:
-            for img_file in sticker_dir.glob(ext):
-                try:
-                    img = Image.open(img_file).convert("RGBA")
-                    self.loaded_stickers.append(img)
-                except Exception as e:
-                    print(f"Ошибка загрузки {img_file}: {e}")
+
+        # Декодирование общее для всех генераций: см. _load_sticker_set
+        key = (str(sticker_dir), sticker_dir.stat().st_mtime)
+        loaded = _load_sticker_set(key[0], key[1], self._stop_cb)
+        if loaded is None:
+            # Загрузка прервана отменой: loaded_stickers остаётся
+            # пустым, и generate() сразу вернёт None
+            return
+        stickers, mipmaps = loaded
+        self.loaded_stickers = list(stickers)
+        self._mipmaps = list(mipmaps)
+        # Прогретые варианты переживают экземпляр генератора
+        self._scaled_cache, self._rotated_cache, self._array_cache = \
+            _get_variant_caches(key)
     
     def _rotate_sticker(self, sticker_img: Image.Image, angle: float) -> Image.Image:
         """Поворачивает изображение стикера."""
-        if angle == 0:
-            return sticker_img.copy()
-            
-        rotated = sticker_img.rotate(angle, expand=True, resample=Image.Resampling.BICUBIC)
-        
-        if rotated.mode in ('RGBA', 'LA'):
-            alpha = rotated.split()[-1]
-            return rotated.convert("RGBA")
-        
-        return Image.new("RGBA", rotated.size, (0, 0, 0, 0))
-    
-    def _apply_opacity(self, sticker_img: Image.Image, opacity: float) -> Image.Image:
-        """Применяет прозрачность к изображению стикера."""
-        if opacity >= 1.0:
+        # Прямые углы — чистая перестановка пикселей без интерполяции;
+        # благодаря квантованию до ROTATION_STEP они выпадают регулярно
+        a = round(angle) % 360
+        if a == 0:
+            # Копия не нужна: вызывающие никогда не меняют результат
             return sticker_img
-            
-        result = sticker_img.copy()
-        alpha = result.split()[3]
-        alpha = alpha.point(lambda p: int(p * opacity))
-        result.putalpha(alpha)
-        return result
+        if a == 90:
+            return sticker_img.transpose(Image.Transpose.ROTATE_90)
+        if a == 180:
+            return sticker_img.transpose(Image.Transpose.ROTATE_180)
+        if a == 270:
+            return sticker_img.transpose(Image.Transpose.ROTATE_270)
+
+        # rotate по RGBA-исходнику всегда возвращает RGBA
+        return sticker_img.rotate(angle, expand=True, resample=Image.Resampling.BICUBIC)
     
-    def generate(self, max_attempts: int = 500) -> Optional[Image.Image]:
-        """Генерирует фоторамку со стикерами."""
+    @staticmethod
+    def _composite(canvas: np.ndarray, fg: np.ndarray,
+                   pos: Tuple[int, int], opacity: float = 1.0):
+        """Накладывает стикер (uint8-массив) на numpy-холст оператором over.
+
+        Полная формула Портера-Даффа в целочисленной арифметике
+        (масштаб 255*255), как в Image.alpha_composite, но запись идёт
+        срезом прямо в холст без промежуточных PIL-объектов.
+        Прозрачность вшита в то же смешивание: альфа умножается на
+        лету, отдельного прохода и копии ради opacity нет.
+        """
+        h, w = fg.shape[:2]
+        canvas_h, canvas_w = canvas.shape[:2]
+        x, y = pos
+
+        # Обрезаем по границам холста: стикеры могут заходить за край
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x + w, canvas_w), min(y + h, canvas_h)
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        fg = fg[y1 - y:y2 - y, x1 - x:x2 - x]
+        opacity_factor = int(opacity * 256)
+
+        # При наличии numba смешивание делает скомпилированное ядро
+        # без промежуточных массивов
+        if _jit_blend_over is not None:
+            _jit_blend_over(canvas, np.ascontiguousarray(fg), x1, y1,
+                            opacity_factor)
+            return
+
+        bg = canvas[y1:y2, x1:x2]
+
+        fg_a = fg[..., 3:].astype(np.uint32)
+        if opacity_factor < 256:
+            fg_a = fg_a * opacity_factor >> 8
+        bg_a = bg[..., 3:].astype(np.uint32)
+        out_a = fg_a * 255 + bg_a * (255 - fg_a)
+        numerator = fg[..., :3] * (fg_a * 255) + bg[..., :3] * (bg_a * (255 - fg_a))
+        bg[..., :3] = numerator // np.maximum(out_a, 1)
+        bg[..., 3:] = out_a // 255
+
+    def generate(self, max_attempts: int = 500,
+                 stop_cb=None, reuse_canvas: bool = True) -> Optional[Image.Image]:
+        """Генерирует фоторамку со стикерами.
+
+        stop_cb — необязательный колбэк отмены: когда он возвращает
+        True (настройки уже изменились), генерация прерывается.
+        reuse_canvas=False запрещает брать холст из пула — нужно, пока
+        отменённая генерация могла не закончить писать в него.
+        """
         if not self.loaded_stickers or not self.config.template_size:
             return None
         
@@ -107,85 +366,157 @@ class StickerFrameGenerator:
         
         algorithm.calculate_sticker_zone()
         
-        # Создаем изображение с фоном
+        # Холст из пула: один uint8-массив на всю генерацию, обратно
+        # в PIL конвертируем только в самом конце.
+        # Компонуем сразу в выходном разрешении: размеры и позиции
+        # стикеров домножаются на коэффициент при наложении, а финальный
+        # LANCZOS-проход по всему холсту не нужен. Алгоритмы размещения
+        # при этом продолжают работать в координатах шаблона.
         template_w, template_h = self.config.template_size
-        result = Image.new("RGBA", (template_w, template_h), self.config.background_color)
+        output_w, output_h = self.config.output_size
+        scale_x = output_w / template_w
+        scale_y = output_h / template_h
+        if reuse_canvas:
+            canvas = _acquire_canvas(output_h, output_w)
+        else:
+            canvas = np.empty((output_h, output_w, 4), dtype=np.uint8)
+        if any(self.config.background_color):
+            canvas[:] = self.config.background_color
+        else:
+            canvas.fill(0)
         
         placed_stickers = []
         attempts = 0
-        
-        while attempts < max_attempts and len(placed_stickers) < len(algorithm.perimeter_positions) // 2:
+
+        # Все случайные величины цикла разыгрываем заранее пакетами:
+        # несколько C-вызовов вместо пяти Python-вызовов random на попытку
+        rng = np.random.default_rng()
+        rand_sticker = rng.integers(0, len(self.loaded_stickers), size=max_attempts)
+        rand_size = rng.integers(self.config.min_sticker_size,
+                                 self.config.max_sticker_size + 1, size=max_attempts)
+        rand_axis = rng.integers(0, 2, size=max_attempts)
+        if self.config.random_rotation:
+            # Квантуем угол, чтобы кэш повёрнутых вариантов попадал
+            # в ограниченный набор ключей
+            rand_rotation = (np.round(rng.uniform(-180, 180, size=max_attempts) /
+                                      self.ROTATION_STEP) * self.ROTATION_STEP)
+        else:
+            rand_rotation = None
+        if self.config.random_opacity:
+            rand_opacity = rng.uniform(self.config.min_opacity,
+                                       self.config.max_opacity,
+                                       size=max_attempts)
+        else:
+            rand_opacity = None
+
+        # Инварианты цикла: все обращения через self.config и hasattr
+        # выносим из горячего пути
+        positions = algorithm.perimeter_positions
+        n_positions = len(positions)
+        placement_limit = n_positions // 2
+        density = self.config.sticker_density
+        density_batch = getattr(algorithm, 'get_gradient_density_batch', None)
+        stickers = self.loaded_stickers
+
+        # Пул индексов позиций: перемешиваем один раз и ходим курсором
+        # вместо random.sample на каждую попытку; занятые позиции
+        # выбрасываются через swap-and-pop
+        pool = [int(i) for i in rng.permutation(n_positions)]
+        cursor = 0
+
+        while attempts < max_attempts and len(placed_stickers) < placement_limit:
+            if stop_cb is not None and stop_cb():
+                return None
+            draw = attempts
             attempts += 1
-            
+
             # Выбираем случайный стикер
-            sticker_img = random.choice(self.loaded_stickers)
-            
+            sticker_idx = int(rand_sticker[draw])
+            sticker_img = stickers[sticker_idx]
+
             # Размер
-            size = random.randint(self.config.min_sticker_size, self.config.max_sticker_size)
-            
+            size = int(rand_size[draw])
+
             # Сохраняем пропорции
             orig_w, orig_h = sticker_img.size
             aspect = orig_w / orig_h
-            
-            if random.choice([True, False]):
+
+            if rand_axis[draw]:
                 width = size
                 height = int(width / aspect)
             else:
                 height = size
                 width = int(height * aspect)
-            
-            # Масштабируем
-            scaled = sticker_img.resize((width, height), Image.Resampling.LANCZOS)
-            
+
             # Поворот
-            rotation = random.uniform(-180, 180) if self.config.random_rotation else 0
-            
+            rotation = float(rand_rotation[draw]) if rand_rotation is not None else 0
+
             # Прозрачность
-            if self.config.random_opacity:
-                opacity = random.uniform(self.config.min_opacity, self.config.max_opacity)
-            else:
-                opacity = 1.0
-            
-            # Пытаемся найти позицию
+            opacity = float(rand_opacity[draw]) if rand_opacity is not None else 1.0
+
+            # Пытаемся найти позицию: окно из следующих позиций пула
             found = False
-            for pos in random.sample(algorithm.perimeter_positions, min(20, len(algorithm.perimeter_positions))):
-                # Для градиентных алгоритмов учитываем плотность
-                if hasattr(algorithm, 'get_gradient_density'):
-                    gradient_factor = algorithm.get_gradient_density(pos)
-                    effective_density = self.config.sticker_density * gradient_factor
-                    if random.random() > effective_density:
-                        continue
-                
-                sticker_config = type('StickerConfig', (), {
-                    'path': "", 'size': (width, height),
-                    'position': pos, 'rotation': rotation,
-                    'opacity': opacity
-                })()
-                
-                if algorithm.is_position_valid(sticker_config, placed_stickers):
-                    # Применяем трансформации
-                    if rotation != 0:
-                        transformed = self._rotate_sticker(scaled, rotation)
+            if not pool:
+                break
+            pool_size = len(pool)
+            if cursor >= pool_size:
+                cursor = 0
+            candidate_count = min(20, pool_size)
+            candidate_idx = [pool[(cursor + j) % pool_size]
+                             for j in range(candidate_count)]
+            # Для градиентных алгоритмов учитываем плотность: одна пакетная
+            # оценка на все кандидаты вместо вызова на каждую позицию
+            if density_batch is not None:
+                gradient_factor = density_batch(positions[candidate_idx])
+                effective_density = density * gradient_factor
+                keep_candidate = np.random.random(candidate_count) <= effective_density
+            else:
+                keep_candidate = None
+            for rank, idx in enumerate(candidate_idx):
+                if keep_candidate is not None and not keep_candidate[rank]:
+                    continue
+                pos = (int(positions[idx, 0]), int(positions[idx, 1]))
+
+                sticker_config = StickerConfig(
+                    path="", size=(width, height),
+                    position=pos, rotation=rotation,
+                    opacity=opacity
+                )
+
+                if algorithm.is_position_valid(sticker_config):
+                    # Добавляем на изображение: трансформации и
+                    # PIL→numpy-конвертация приходят из кэшей,
+                    # прозрачность применяется прямо при смешивании
+                    if scale_x != 1.0 or scale_y != 1.0:
+                        draw_w = max(1, round(width * scale_x))
+                        draw_h = max(1, round(height * scale_y))
+                        draw_pos = (round(pos[0] * scale_x),
+                                    round(pos[1] * scale_y))
                     else:
-                        transformed = scaled
-                    
-                    if opacity < 1.0:
-                        transformed = self._apply_opacity(transformed, opacity)
-                    
-                    # Добавляем на изображение
-                    result.alpha_composite(transformed, pos)
+                        draw_w, draw_h, draw_pos = width, height, pos
+                    transformed = self._get_blend_array(sticker_idx, draw_w,
+                                                        draw_h, rotation)
+                    self._composite(canvas, transformed, draw_pos, opacity)
+                    algorithm.register_placement(sticker_config)
                     placed_stickers.append(sticker_config)
+                    # Позиция занята — убираем из пула за O(1)
+                    taken = (cursor + rank) % pool_size
+                    pool[taken] = pool[-1]
+                    pool.pop()
                     found = True
                     break
-            
+
+            # Сдвигаем курсор за просмотренное окно
+            cursor = cursor + candidate_count if pool else 0
+
             if not found:
                 break
         
-        # Масштабируем до выходного размера
-        if self.config.output_size != self.config.template_size:
-            result = result.resize(self.config.output_size, Image.Resampling.LANCZOS)
-        
-        return result
+        # Пуловый холст вернётся в оборот на следующей генерации —
+        # итоговому изображению нужна собственная копия данных; свежий
+        # буфер отдаём без копии
+        return Image.fromarray(canvas.copy() if reuse_canvas else canvas,
+                               "RGBA")
 
 
 class GenerationThread(QThread):
@@ -193,14 +524,21 @@ class GenerationThread(QThread):
     generation_complete = pyqtSignal(object)
     generation_error = pyqtSignal(str)
     
-    def __init__(self, config: FrameConfig):
+    def __init__(self, config: FrameConfig, reuse_canvas: bool = True):
         super().__init__()
         self.config = config
-    
+        self.reuse_canvas = reuse_canvas
+
     def run(self):
         try:
-            generator = StickerFrameGenerator(self.config)
-            result = generator.generate()
+            generator = StickerFrameGenerator(
+                self.config, stop_cb=self.isInterruptionRequested)
+            if self.isInterruptionRequested():
+                return  # отменили ещё на загрузке стикеров
+            result = generator.generate(stop_cb=self.isInterruptionRequested,
+                                        reuse_canvas=self.reuse_canvas)
+            if self.isInterruptionRequested():
+                return  # устаревший запуск, результат никому не нужен
             if result:
                 self.generation_complete.emit(result)
             else:
@@ -209,6 +547,111 @@ class GenerationThread(QThread):
             self.generation_error.emit(str(e))
 
 
+class SaveThread(QThread):
+    """Поток для сохранения изображения
+
+    Кодирование PNG может занимать секунды, поэтому уходит из GUI-потока
+    по образцу GenerationThread. Параметры подобраны в пользу скорости:
+    PNG compress_level=3 кодируется в разы быстрее при близком размере.
+    """
+    save_complete = pyqtSignal(str)
+    save_error = pyqtSignal(str)
+
+    SAVE_OPTIONS = {
+        "PNG": {"compress_level": 3},
+        "JPEG": {"quality": 90, "optimize": False},
+        "WEBP": {"method": 4},
+    }
+
+    def __init__(self, image: Image.Image, file_path: str, fmt: str):
+        super().__init__()
+        self.image = image
+        self.file_path = file_path
+        self.fmt = fmt
+
+    def run(self):
+        try:
+            # Кодируем в память и пишем файл одним вызовом: Pillow
+            # иначе выталкивает результат на диск маленькими кусками,
+            # что особенно заметно на сетевых дисках
+            buffer = io.BytesIO()
+            self.image.save(buffer, format=self.fmt,
+                            **self.SAVE_OPTIONS.get(self.fmt, {}))
+            Path(self.file_path).write_bytes(buffer.getbuffer())
+            self.save_complete.emit(self.file_path)
+        except Exception as e:
+            self.save_error.emit(str(e))
+
+
+# Таблицы стилей — константы модуля: Qt разбирает каждую строку один
+# раз на виджет, и держать одинаковый CSS в теле конструкторов незачем
+_PREVIEW_WIDGET_QSS = """
+    PreviewWidget {
+        background-color: #2d2d2d;
+        border: 2px solid #444444;
+        border-radius: 5px;
+    }
+"""
+
+_GENERATE_BTN_QSS = """
+    QPushButton {
+        background-color: #4CAF50;
+        color: white;
+        font-weight: bold;
+        padding: 12px;
+        border-radius: 6px;
+        font-size: 14px;
+    }
+    QPushButton:hover {
+        background-color: #45a049;
+    }
+    QPushButton:disabled {
+        background-color: #555555;
+    }
+"""
+
+_SAVE_BTN_QSS = """
+    QPushButton {
+        background-color: #2196F3;
+        color: white;
+        font-weight: bold;
+        padding: 12px;
+        border-radius: 6px;
+        font-size: 14px;
+    }
+    QPushButton:hover {
+        background-color: #1976D2;
+    }
+    QPushButton:disabled {
+        background-color: #555555;
+    }
+"""
+
+_RANDOM_BTN_QSS = """
+    QPushButton {
+        background-color: #9C27B0;
+        color: white;
+        font-weight: bold;
+        padding: 10px;
+        border-radius: 5px;
+    }
+    QPushButton:hover {
+        background-color: #7B1FA2;
+    }
+"""
+
+_PREVIEW_GROUP_QSS = """
+    QGroupBox {
+        font-weight: bold;
+        border: 2px solid #555555;
+        border-radius: 5px;
+        margin-top: 10px;
+        padding-top: 10px;
+        font-size: 14px;
+    }
+"""
+
+
 class PreviewWidget(QLabel):
     """Виджет для предпросмотра с фиксированным соотношением сторон"""
     
@@ -217,13 +660,7 @@ class PreviewWidget(QLabel):
         self.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.setMinimumSize(400, 300)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-        self.setStyleSheet("""
-            PreviewWidget {
-                background-color: #2d2d2d;
-                border: 2px solid #444444;
-                border-radius: 5px;
-            }
-        """)
+        self.setStyleSheet(_PREVIEW_WIDGET_QSS)
         self.setText("Предпросмотр появится здесь")
         self.setFont(QFont("Arial", 12))
         self._aspect_ratio = 16/9
@@ -275,11 +712,36 @@ class SettingsPanel(QWidget):
     generate_requested = pyqtSignal()
     save_requested = pyqtSignal()
     
+    # Задержка дребезга настроек: серия изменений (перетаскивание
+    # слайдера) сливается в одну генерацию
+    DEBOUNCE_MS = 150
+
     def __init__(self):
         super().__init__()
         self.config = FrameConfig()
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.timeout.connect(self._emit_settings)
+        # Пакетное обновление виджетов: пока флаг поднят,
+        # on_settings_changed ничего не пересобирает
+        self._suspend_change = False
         self.init_ui()
         self.setFixedWidth(380)  # Чуть шире для нового выбора алгоритма
+
+    @contextmanager
+    def _batched_updates(self):
+        """Глушит реакции на изменения виджетов внутри блока.
+
+        Программная установка десятка значений подряд (random_settings)
+        без этого дёргала бы пересборку конфигурации на каждый виджет;
+        по выходе из блока изменения применяются одним вызовом.
+        """
+        self._suspend_change = True
+        try:
+            yield
+        finally:
+            self._suspend_change = False
+        self.on_settings_changed()
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -433,6 +895,8 @@ class SettingsPanel(QWidget):
             ("Только углы", BorderSide.CORNERS)
         ]
         
+        # Карта сторона -> кнопка, чтобы не искать по дереву виджетов
+        self._side_buttons = {}
         row, col = 0, 0
         for text, side in sides:
             radio = QRadioButton(text)
@@ -441,6 +905,7 @@ class SettingsPanel(QWidget):
                 radio.setChecked(True)
             sides_group.addButton(radio)
             sides_layout.addWidget(radio, row, col)
+            self._side_buttons[side] = radio
             col += 1
             if col > 1:
                 col = 0
@@ -548,59 +1013,18 @@ class SettingsPanel(QWidget):
         
         # Кнопка генерации
         self.generate_btn = QPushButton("🎨 Сгенерировать фоторамку")
-        self.generate_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #4CAF50;
-                color: white;
-                font-weight: bold;
-                padding: 12px;
-                border-radius: 6px;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                background-color: #45a049;
-            }
-            QPushButton:disabled {
-                background-color: #555555;
-            }
-        """)
+        self.generate_btn.setStyleSheet(_GENERATE_BTN_QSS)
         self.generate_btn.clicked.connect(self.generate_requested.emit)
         
         # Кнопка сохранения
         self.save_btn = QPushButton("💾 Сохранить изображение")
         self.save_btn.setEnabled(False)
-        self.save_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #2196F3;
-                color: white;
-                font-weight: bold;
-                padding: 12px;
-                border-radius: 6px;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                background-color: #1976D2;
-            }
-            QPushButton:disabled {
-                background-color: #555555;
-            }
-        """)
+        self.save_btn.setStyleSheet(_SAVE_BTN_QSS)
         self.save_btn.clicked.connect(self.save_requested.emit)
         
         # Кнопка случайных настроек
         self.random_btn = QPushButton("🎲 Случайные настройки")
-        self.random_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #9C27B0;
-                color: white;
-                font-weight: bold;
-                padding: 10px;
-                border-radius: 5px;
-            }
-            QPushButton:hover {
-                background-color: #7B1FA2;
-            }
-        """)
+        self.random_btn.setStyleSheet(_RANDOM_BTN_QSS)
         self.random_btn.clicked.connect(self.random_settings)
         
         button_layout.addWidget(self.generate_btn)
@@ -621,116 +1045,119 @@ class SettingsPanel(QWidget):
             self.dir_label.setText(os.path.basename(directory))
             self.dir_label.setToolTip(directory)
             self.dir_label.setStyleSheet("color: white;")
-            self.config.sticker_dir = directory
+            self.config = replace(self.config, sticker_dir=directory)
             self.on_settings_changed()
     
     def on_side_changed(self, button):
         """Обработчик изменения выбранной стороны"""
-        side_value = button.property("side")
-        for side in BorderSide:
-            if side.value == side_value:
-                self.config.border_sides = side
-                break
+        # Поиск enum по значению — O(1) через конструктор вместо перебора
+        self.config = replace(self.config,
+                              border_sides=BorderSide(button.property("side")))
         self.on_settings_changed()
     
     def on_settings_changed(self):
         """Обработчик изменения настроек"""
-        # Основные настройки
-        self.config.template_size = (
-            self.template_width.value(),
-            self.template_height.value()
-        )
-        self.config.output_size = (
-            self.output_width.value(),
-            self.output_height.value()
+        if self._suspend_change:
+            return
+        # Конфигурация заморожена, поэтому собираем новый экземпляр
+        # из всех виджетов одним replace
+        self.config = replace(
+            self.config,
+            # Основные настройки
+            template_size=(
+                self.template_width.value(),
+                self.template_height.value()
+            ),
+            output_size=(
+                self.output_width.value(),
+                self.output_height.value()
+            ),
+            preview_aspect=self.preview_aspect_check.isChecked(),
+            # Выбор алгоритма
+            algorithm=self.algorithm_combo.currentData(),
+            # Стикеры
+            min_sticker_size=self.min_size.value(),
+            max_sticker_size=self.max_size.value(),
+            sticker_density=self.density_slider.value() / 100.0,
+            border_width=self.border_width.value(),
+            border_overlap=self.border_overlap.value(),
+            # Эффекты
+            overlap_allowed=self.overlap_check.isChecked(),
+            random_rotation=self.rotation_check.isChecked(),
+            random_opacity=self.opacity_check.isChecked(),
+            min_opacity=self.min_opacity.value(),
+            max_opacity=self.max_opacity.value(),
+            preview_auto=self.auto_preview_check.isChecked(),
+            # Градиент
+            gradient_density=self.gradient_check.isChecked(),
+            gradient_type=_GRAD_TYPES[self.gradient_combo.currentIndex()],
+            # Выходной файл
+            output_format=self.format_combo.currentText(),
         )
-        self.config.preview_aspect = self.preview_aspect_check.isChecked()
-        
-        # Выбор алгоритма
-        self.config.algorithm = self.algorithm_combo.currentData()
-        
-        # Стикеры
-        self.config.min_sticker_size = self.min_size.value()
-        self.config.max_sticker_size = self.max_size.value()
-        self.config.sticker_density = self.density_slider.value() / 100.0
-        self.config.border_width = self.border_width.value()
-        self.config.border_overlap = self.border_overlap.value()
-        
+
         # Обновляем метку плотности
         self.density_label.setText(f"{self.density_slider.value()}%")
-        
-        # Эффекты
-        self.config.overlap_allowed = self.overlap_check.isChecked()
-        self.config.random_rotation = self.rotation_check.isChecked()
-        self.config.random_opacity = self.opacity_check.isChecked()
-        self.config.min_opacity = self.min_opacity.value()
-        self.config.max_opacity = self.max_opacity.value()
-        self.config.preview_auto = self.auto_preview_check.isChecked()
-        
-        # Градиент
-        self.config.gradient_density = self.gradient_check.isChecked()
-        gradient_text = self.gradient_combo.currentText()
-        self.config.gradient_type = "linear" if gradient_text == "Линейный" else "radial"
-        
-        # Выходной файл
-        self.config.output_format = self.format_combo.currentText()
-        
+
         # Включаем/выключаем связанные элементы
         self.gradient_combo.setEnabled(self.gradient_check.isChecked())
         self.min_opacity.setEnabled(self.opacity_check.isChecked())
         self.max_opacity.setEnabled(self.opacity_check.isChecked())
         
-        # Эмитируем сигнал
+        # Эмитируем сигнал через таймер: пока настройки продолжают
+        # меняться, отложенный запуск переносится
+        self._debounce.start(self.DEBOUNCE_MS)
+
+    def _emit_settings(self):
+        """Рассылает накопленное изменение настроек после паузы."""
         self.settings_changed.emit(self.config)
-        
+
         # Если включена автогенерация, запрашиваем генерацию
         if self.config.preview_auto and self.config.sticker_dir:
             self.generate_requested.emit()
     
     def random_settings(self):
         """Случайные настройки"""
-        # Случайный размер шаблона
-        sizes = [(800, 600), (1200, 800), (1600, 900), (1920, 1080)]
-        size = random.choice(sizes)
-        self.template_width.setValue(size[0])
-        self.template_height.setValue(size[1])
-        
-        # Случайный алгоритм
-        self.algorithm_combo.setCurrentIndex(random.randint(0, self.algorithm_combo.count()-1))
-        
-        # Случайная плотность
-        self.density_slider.setValue(random.randint(30, 90))
-        
-        # Случайные размеры стикеров
-        self.min_size.setValue(random.randint(20, 80))
-        self.max_size.setValue(random.randint(100, 250))
-        
-        # Случайная ширина рамки
-        self.border_width.setValue(random.randint(50, 200))
-        
-        # Случайный заход за границу
-        self.border_overlap.setValue(random.randint(0, 100))
-        
-        # Случайные стороны
-        sides = list(BorderSide)
-        random_side = random.choice(sides)
-        for btn in self.findChildren(QRadioButton):
-            if btn.property("side") == random_side.value:
-                btn.setChecked(True)
-                break
-        
-        # Случайные флажки
-        self.overlap_check.setChecked(random.choice([True, False]))
-        self.rotation_check.setChecked(random.choice([True, False]))
-        self.opacity_check.setChecked(random.choice([True, False]))
-        self.gradient_check.setChecked(random.choice([True, False]))
-        
-        # Случайный тип градиента
-        self.gradient_combo.setCurrentIndex(random.randint(0, 1))
-        
-        # Случайная прозрачность
-        self.min_opacity.setValue(round(random.uniform(0.3, 0.8), 1))
-        self.max_opacity.setValue(round(random.uniform(0.8, 1.0), 1))
+        # Все виджеты выставляются под глушителем: конфигурация
+        # пересобирается один раз по выходе из блока
+        with self._batched_updates():
+            # Случайный размер шаблона
+            sizes = [(800, 600), (1200, 800), (1600, 900), (1920, 1080)]
+            size = random.choice(sizes)
+            self.template_width.setValue(size[0])
+            self.template_height.setValue(size[1])
+        
+            # Случайный алгоритм
+            self.algorithm_combo.setCurrentIndex(random.randint(0, self.algorithm_combo.count()-1))
+        
+            # Случайная плотность
+            self.density_slider.setValue(random.randint(30, 90))
+        
+            # Случайные размеры стикеров
+            self.min_size.setValue(random.randint(20, 80))
+            self.max_size.setValue(random.randint(100, 250))
+        
+            # Случайная ширина рамки
+            self.border_width.setValue(random.randint(50, 200))
+        
+            # Случайный заход за границу
+            self.border_overlap.setValue(random.randint(0, 100))
+        
+            # Случайные стороны: прямой доступ по карте кнопок
+            random_side = random.choice(list(BorderSide))
+            self._side_buttons[random_side].setChecked(True)
+        
+            # Случайные флажки
+            self.overlap_check.setChecked(random.choice([True, False]))
+            self.rotation_check.setChecked(random.choice([True, False]))
+            self.opacity_check.setChecked(random.choice([True, False]))
+            self.gradient_check.setChecked(random.choice([True, False]))
+        
+            # Случайный тип градиента
+            self.gradient_combo.setCurrentIndex(random.randint(0, 1))
+        
+            # Случайная прозрачность
+            self.min_opacity.setValue(round(random.uniform(0.3, 0.8), 1))
+            self.max_opacity.setValue(round(random.uniform(0.8, 1.0), 1))
     
     def get_config(self) -> FrameConfig:
         """Возвращает текущую конфигурацию"""
@@ -748,6 +1175,15 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.current_image = None
         self.generation_thread = None
+        # Отменённые, но ещё работающие потоки генерации: ссылки нужно
+        # держать до их завершения, иначе Qt уничтожит объект потока
+        # на ходу ("QThread: Destroyed while thread is still running")
+        self._retired_threads = []
+        self.save_thread = None
+        self._rgb_cache = None
+        # Последний применённый размер шаблона: пересчёт пропорций
+        # предпросмотра нужен только когда размер реально меняется
+        self._last_template_size = None
         self.init_ui()
         self.setWindowTitle("Генератор фоторамок из стикеров")
         self.setGeometry(100, 100, 1400, 800)
@@ -775,16 +1211,7 @@ class MainWindow(QMainWindow):
         
         # Панель предпросмотра
         preview_group = QGroupBox("Предпросмотр")
-        preview_group.setStyleSheet("""
-            QGroupBox {
-                font-weight: bold;
-                border: 2px solid #555555;
-                border-radius: 5px;
-                margin-top: 10px;
-                padding-top: 10px;
-                font-size: 14px;
-            }
-        """)
+        preview_group.setStyleSheet(_PREVIEW_GROUP_QSS)
         
         preview_layout = QVBoxLayout()
         preview_layout.setContentsMargins(5, 15, 5, 5)
@@ -839,20 +1266,20 @@ class MainWindow(QMainWindow):
         # Обновляем количество стикеров
         if config.sticker_dir:
             try:
-                sticker_dir = Path(config.sticker_dir)
-                count = len(list(sticker_dir.glob("*.png"))) + \
-                        len(list(sticker_dir.glob("*.jpg"))) + \
-                        len(list(sticker_dir.glob("*.jpeg"))) + \
-                        len(list(sticker_dir.glob("*.webp")))
+                count = _count_stickers(config.sticker_dir,
+                                        os.stat(config.sticker_dir).st_mtime)
                 self.stickers_label.setText(f"Стикеры: {count}")
             except:
                 self.stickers_label.setText("Стикеры: ошибка")
         else:
             self.stickers_label.setText("Стикеры: не выбрано")
         
-        # Обновляем соотношение сторон в предпросмотре
-        if config.preview_aspect:
+        # Обновляем соотношение сторон в предпросмотре, только если
+        # размер шаблона действительно изменился
+        if (config.preview_aspect and
+                config.template_size != self._last_template_size):
             self.preview_widget.set_aspect_ratio(*config.template_size)
+            self._last_template_size = config.template_size
     
     def generate_frame(self):
         """Генерация фоторамки"""
@@ -868,16 +1295,55 @@ class MainWindow(QMainWindow):
         self.status_label.setText("Генерация...")
         self.status_label.setStyleSheet("color: #FF9800; font-weight: bold; font-size: 11px;")
         
-        # Запускаем в отдельном потоке
-        self.generation_thread = GenerationThread(config)
+        # Отменяем устаревший запуск. Ждать его нельзя (загрузка
+        # стикеров может идти дольше любого разумного таймаута), поэтому
+        # поток уходит в список отставных до своего finished
+        self._reap_retired_threads()
+        if self.generation_thread and self.generation_thread.isRunning():
+            retiring = self.generation_thread
+            retiring.requestInterruption()
+            # Результат отставного потока никому не нужен
+            retiring.generation_complete.disconnect(self.on_generation_complete)
+            retiring.generation_error.disconnect(self.on_generation_error)
+            retiring.finished.connect(self._reap_retired_threads)
+            self._retired_threads.append(retiring)
+
+        # Запускаем в отдельном потоке. Пока жив хотя бы один отставной
+        # поток, пулом холстов пользоваться нельзя — он мог не закончить
+        # писать в пуловый буфер
+        self.generation_thread = GenerationThread(
+            config, reuse_canvas=not self._retired_threads)
         self.generation_thread.generation_complete.connect(self.on_generation_complete)
         self.generation_thread.generation_error.connect(self.on_generation_error)
         self.generation_thread.start()
-    
+
+    def _reap_retired_threads(self):
+        """Отпускает ссылки на завершившиеся отменённые потоки."""
+        self._retired_threads = [t for t in self._retired_threads
+                                 if t.isRunning()]
+
     def on_generation_complete(self, image: Image.Image):
         """Обработчик завершения генерации"""
+        # Старый кадр (вместе с RGB-копией) освобождаем явно: это до
+        # ~8 МБ на 1920x1080, которые иначе живут до сборщика мусора.
+        # Пока кадр пишет SaveThread, закрывать его нельзя
+        if not (self.save_thread and self.save_thread.isRunning()):
+            if self.current_image is not None:
+                self.current_image.close()
+            if self._rgb_cache is not None:
+                self._rgb_cache.close()
         self.current_image = image
-        self.preview_widget.update_preview(image)
+        self._rgb_cache = None
+        # В предпросмотр отдаём уменьшенную копию: полноразмерный кадр
+        # таскать через QImage при каждой перерисовке незачем
+        preview_img = image
+        widget_size = self.preview_widget.size()
+        if (image.width > widget_size.width() or
+                image.height > widget_size.height()):
+            preview_img = image.copy()
+            preview_img.thumbnail((widget_size.width(), widget_size.height()),
+                                  Image.Resampling.BILINEAR)
+        self.preview_widget.update_preview(preview_img)
         self.settings_panel.enable_save_button(True)
         self.settings_panel.generate_btn.setEnabled(True)
         self.status_label.setText("Готово")
@@ -901,13 +1367,7 @@ class MainWindow(QMainWindow):
         config = self.settings_panel.get_config()
         
         # Определяем расширение файла
-        extensions = {
-            "PNG": "png",
-            "JPEG": "jpg",
-            "WEBP": "webp"
-        }
-        
-        ext = extensions.get(config.output_format, "png")
+        ext = _EXT_MAP.get(config.output_format, "png")
         
         file_path, _ = QFileDialog.getSaveFileName(
             self,
@@ -917,29 +1377,126 @@ class MainWindow(QMainWindow):
         )
         
         if file_path:
-            try:
-                # Конвертируем формат если нужно
-                if config.output_format == "JPEG":
-                    self.current_image = self.current_image.convert("RGB")
-                
-                self.current_image.save(file_path, config.output_format.upper())
-                self.statusBar().showMessage(f"Изображение сохранено: {file_path}")
-                QMessageBox.information(self, "Успех", f"Изображение сохранено в:\n{file_path}")
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить файл: {str(e)}")
+            # Конвертируем формат если нужно. RGBA-оригинал не трогаем:
+            # RGB-вариант кэшируется до следующей генерации, повторные
+            # сохранения в JPEG не конвертируют заново
+            if config.output_format == "JPEG":
+                if self._rgb_cache is None:
+                    self._rgb_cache = self.current_image.convert("RGB")
+                image_to_save = self._rgb_cache
+            else:
+                image_to_save = self.current_image
+
+            # Кодирование уходит в поток, интерфейс остаётся живым
+            self.settings_panel.save_btn.setEnabled(False)
+            self.statusBar().showMessage("Сохранение...")
+            self.save_thread = SaveThread(image_to_save, file_path,
+                                          config.output_format.upper())
+            self.save_thread.save_complete.connect(self.on_save_complete)
+            self.save_thread.save_error.connect(self.on_save_error)
+            self.save_thread.start()
+
+    def on_save_complete(self, file_path: str):
+        """Обработчик завершения сохранения"""
+        self.settings_panel.save_btn.setEnabled(True)
+        self.statusBar().showMessage(f"Изображение сохранено: {file_path}")
+        QMessageBox.information(self, "Успех", f"Изображение сохранено в:\n{file_path}")
+
+    def on_save_error(self, error_msg: str):
+        """Обработчик ошибки сохранения"""
+        self.settings_panel.save_btn.setEnabled(True)
+        QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить файл: {error_msg}")
     
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
-        if self.generation_thread and self.generation_thread.isRunning():
-            self.generation_thread.terminate()
-            self.generation_thread.wait()
+        # Кооперативная остановка вместо terminate: генерация проверяет
+        # флаг прерывания и выходит сама, terminate — только как крайний
+        # случай, если поток не ответил за 2 секунды
+        for thread in [self.generation_thread] + self._retired_threads:
+            if thread and thread.isRunning():
+                thread.requestInterruption()
+                if not thread.wait(2000):
+                    thread.terminate()
+                    thread.wait()
+        # Даём завершиться начатому сохранению, чтобы не оставить
+        # недописанный файл
+        if self.save_thread and self.save_thread.isRunning():
+            self.save_thread.wait()
         event.accept()
 
 
+# Единичные тригонометрические таблицы фигур: углы не зависят от
+# размера стикера, поэтому cos/sin считаются один раз на модуль,
+# а в _draw_test_sticker остаётся только умножение на радиус
+_star_angles = np.empty(10)
+_star_angles[0::2] = math.pi/2 + np.arange(5) * 2*math.pi/5
+_star_angles[1::2] = _star_angles[0::2] + math.pi/5
+_STAR_COS = np.cos(_star_angles)
+_STAR_SIN = np.sin(_star_angles)
+_hex_angles = np.arange(6) * 2*math.pi/6
+_HEX_COS = np.cos(_hex_angles)
+_HEX_SIN = np.sin(_hex_angles)
+del _star_angles, _hex_angles
+
+
+def _draw_test_sticker(directory, i, shape_type, name, color):
+    """Рисует и сохраняет один тестовый стикер."""
+    size = random.randint(100, 300)
+    img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+
+    margin = 20
+
+    if shape_type == "circle":
+        draw.ellipse([margin, margin, size-margin, size-margin], fill=color)
+    elif shape_type == "square":
+        draw.rectangle([margin, margin, size-margin, size-margin], fill=color)
+    elif shape_type == "triangle":
+        points = [(size//2, margin), (margin, size-margin), (size-margin, size-margin)]
+        draw.polygon(points, fill=color)
+    elif shape_type == "star":
+        # Все десять вершин одним векторным выражением по готовым
+        # таблицам cos/sin вместо поштучных math.cos/math.sin
+        outer_r = (size - 2*margin) // 2
+        inner_r = outer_r // 2
+        radii = np.empty(10)
+        radii[0::2] = outer_r
+        radii[1::2] = inner_r
+        xs = (size//2 + radii * _STAR_COS).astype(int)
+        ys = (size//2 + radii * _STAR_SIN).astype(int)
+        draw.polygon(list(zip(xs.tolist(), ys.tolist())), fill=color)
+    elif shape_type == "heart":
+        draw.ellipse([margin, margin, size//2, size//2], fill=color)
+        draw.ellipse([size//2, margin, size-margin, size//2], fill=color)
+        points = [
+            (margin, size//4),
+            (size-margin, size//4),
+            (size//2, size-margin)
+        ]
+        draw.polygon(points, fill=color)
+    elif shape_type == "hexagon":
+        r = (size - 2*margin) // 2
+        xs = (size//2 + r * _HEX_COS).astype(int)
+        ys = (size//2 + r * _HEX_SIN).astype(int)
+        draw.polygon(list(zip(xs.tolist(), ys.tolist())), fill=color)
+    
+    draw.text((size//2, size//2), name, fill=(255, 255, 255, 255), anchor="mm")
+    # Тестовым стикерам не нужен плотный deflate: минимальное сжатие
+    # почти убирает стоимость кодирования PNG
+    img.save(f"{directory}/{shape_type}_{i}.png",
+             optimize=False, compress_level=1)
+
+
 def create_test_stickers(directory="test_stickers"):
     """Создает тестовые стикеры"""
     os.makedirs(directory, exist_ok=True)
-    
+
+    # Манифест успешной генерации: повторные запуски не перерисовывают
+    # и не перекодируют стикеры заново
+    manifest = Path(directory) / ".generated"
+    if manifest.exists():
+        return directory
+
     shapes = [
         ("circle", "Круг", (255, 0, 0, 200)),
         ("square", "Квадрат", (0, 255, 0, 200)),
@@ -948,92 +1505,67 @@ def create_test_stickers(directory="test_stickers"):
         ("heart", "Сердце", (255, 0, 255, 200)),
         ("hexagon", "Шестиугольник", (0, 255, 255, 200)),
     ]
-    
-    for i, (shape_type, name, color) in enumerate(shapes):
-        size = random.randint(100, 300)
-        img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        
-        margin = 20
-        
-        if shape_type == "circle":
-            draw.ellipse([margin, margin, size-margin, size-margin], fill=color)
-        elif shape_type == "square":
-            draw.rectangle([margin, margin, size-margin, size-margin], fill=color)
-        elif shape_type == "triangle":
-            points = [(size//2, margin), (margin, size-margin), (size-margin, size-margin)]
-            draw.polygon(points, fill=color)
-        elif shape_type == "star":
-            points = []
-            for j in range(5):
-                angle = math.pi/2 + j * 2*math.pi/5
-                outer_r = (size - 2*margin) // 2
-                inner_r = outer_r // 2
-                
-                points.append((
-                    size//2 + int(outer_r * math.cos(angle)),
-                    size//2 + int(outer_r * math.sin(angle))
-                ))
-                
-                angle += math.pi/5
-                points.append((
-                    size//2 + int(inner_r * math.cos(angle)),
-                    size//2 + int(inner_r * math.sin(angle))
-                ))
-            draw.polygon(points, fill=color)
-        elif shape_type == "heart":
-            draw.ellipse([margin, margin, size//2, size//2], fill=color)
-            draw.ellipse([size//2, margin, size-margin, size//2], fill=color)
-            points = [
-                (margin, size//4),
-                (size-margin, size//4),
-                (size//2, size-margin)
-            ]
-            draw.polygon(points, fill=color)
-        elif shape_type == "hexagon":
-            points = []
-            for j in range(6):
-                angle = j * 2*math.pi/6
-                r = (size - 2*margin) // 2
-                points.append((
-                    size//2 + int(r * math.cos(angle)),
-                    size//2 + int(r * math.sin(angle))
-                ))
-            draw.polygon(points, fill=color)
-        
-        draw.text((size//2, size//2), name, fill=(255, 255, 255, 255), anchor="mm")
-        img.save(f"{directory}/{shape_type}_{i}.png")
-    
+
+    # PNG-кодирование отпускает GIL, поэтому стикеры рисуются параллельно
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(
+            lambda item: _draw_test_sticker(directory, item[0], *item[1]),
+            enumerate(shapes)))
+
+    manifest.write_text(str(len(shapes)))
     print(f"Созданы тестовые стикеры в папке '{directory}'")
     return directory
 
 
+# Тёмная тема: роли и цвета одной таблицей вместо 13 отдельных вызовов
+_DARK_PALETTE_SPEC = (
+    (QPalette.ColorRole.Window, (53, 53, 53)),
+    (QPalette.ColorRole.WindowText, Qt.GlobalColor.white),
+    (QPalette.ColorRole.Base, (35, 35, 35)),
+    (QPalette.ColorRole.AlternateBase, (53, 53, 53)),
+    (QPalette.ColorRole.ToolTipBase, Qt.GlobalColor.white),
+    (QPalette.ColorRole.ToolTipText, Qt.GlobalColor.white),
+    (QPalette.ColorRole.Text, Qt.GlobalColor.white),
+    (QPalette.ColorRole.Button, (53, 53, 53)),
+    (QPalette.ColorRole.ButtonText, Qt.GlobalColor.white),
+    (QPalette.ColorRole.BrightText, Qt.GlobalColor.red),
+    (QPalette.ColorRole.Highlight, (42, 130, 218)),
+    (QPalette.ColorRole.HighlightedText, Qt.GlobalColor.black),
+)
+
+
+@functools.cache
+def _build_dark_palette() -> QPalette:
+    """Собирает палитру тёмной темы один раз на процесс."""
+    palette = QPalette()
+    for role, color in _DARK_PALETTE_SPEC:
+        palette.setColor(role,
+                         QColor(*color) if isinstance(color, tuple) else color)
+    return palette
+
+
 def main():
     """Точка входа в приложение"""
     app = QApplication(sys.argv)
-    
+
     # Устанавливаем стиль
     app.setStyle("Fusion")
-    
+
     # Темная тема
-    dark_palette = QPalette()
-    dark_palette.setColor(QPalette.ColorRole.Window, QColor(53, 53, 53))
-    dark_palette.setColor(QPalette.ColorRole.WindowText, Qt.GlobalColor.white)
-    dark_palette.setColor(QPalette.ColorRole.Base, QColor(35, 35, 35))
-    dark_palette.setColor(QPalette.ColorRole.AlternateBase, QColor(53, 53, 53))
-    dark_palette.setColor(QPalette.ColorRole.ToolTipBase, Qt.GlobalColor.white)
-    dark_palette.setColor(QPalette.ColorRole.ToolTipText, Qt.GlobalColor.white)
-    dark_palette.setColor(QPalette.ColorRole.Text, Qt.GlobalColor.white)
-    dark_palette.setColor(QPalette.ColorRole.Button, QColor(53, 53, 53))
-    dark_palette.setColor(QPalette.ColorRole.ButtonText, Qt.GlobalColor.white)
-    dark_palette.setColor(QPalette.ColorRole.BrightText, Qt.GlobalColor.red)
-    dark_palette.setColor(QPalette.ColorRole.Highlight, QColor(42, 130, 218))
-    dark_palette.setColor(QPalette.ColorRole.HighlightedText, Qt.GlobalColor.black)
-    app.setPalette(dark_palette)
+    app.setPalette(_build_dark_palette())
     
-    # Создаем тестовые стикеры если нужно
+    # Создаем тестовые стикеры если нужно. Сначала маркер .generated —
+    # одна проверка существования вместо чтения директории; scandir
+    # остаётся запасным путём для папок, наполненных вручную
     test_dir = "test_stickers"
-    if not os.path.exists(test_dir) or len(list(Path(test_dir).glob("*.png"))) == 0:
+    has_png = os.path.exists(os.path.join(test_dir, ".generated"))
+    if not has_png:
+        try:
+            has_png = any(entry.name.endswith(".png")
+                          for entry in os.scandir(test_dir))
+        except FileNotFoundError:
+            has_png = False
+    if not has_png:
         reply = QMessageBox.question(
             None,
             "Тестовые стикеры",